@@ -5,23 +5,41 @@ Connects ONVIF camera audio to Wyoming Faster Whisper
 """
 
 import asyncio
-import json
 import logging
 import os
+import socket
 import sys
 import tempfile
+import threading
 import wave
+from collections import deque
 from pathlib import Path
 from typing import Optional
 
+import aiohttp
 import av
 import numpy as np
-import requests
 import webrtcvad
 from wyoming.asr import Transcribe, Transcript
 from wyoming.audio import AudioChunk, AudioStart, AudioStop
 from wyoming.client import AsyncClient
 
+# orjson só tem wheel musl para x86_64/aarch64; nas demais arches do add-on
+# (armhf/armv7/i386) usa o json da stdlib — nada aqui é caminho quente
+# (config uma vez no startup e payloads pequenos do HA)
+try:
+    import orjson
+    _json_loads = orjson.loads
+
+    def _json_dumps(obj) -> bytes:
+        return orjson.dumps(obj)
+except ImportError:
+    import json
+    _json_loads = json.loads
+
+    def _json_dumps(obj) -> bytes:
+        return json.dumps(obj).encode()
+
 # Configuração de logging
 logging.basicConfig(
     level=logging.INFO,
@@ -38,103 +56,278 @@ class WyomingClient:
         self.host = host
         self.port = port
         self.uri = f"tcp://{host}:{port}"
-        
+        # Conexão persistente: conecta uma vez e reusa entre enunciados
+        self._client: Optional[AsyncClient] = None
+        # Serializa enunciados na mesma conexão (protocolo é request/response)
+        self._lock = asyncio.Lock()
+        # Estado do modo streaming (um enunciado aberto por vez)
+        self._streaming = False
+        self._stream_params = (16000, 2, 1)
+        self._streamed_bytes = 0
+        # Coalescência do streaming: junta frames de 30ms até ~256ms
+        # (4096 samples) antes de escrever — 8x menos eventos/writes
+        self._stream_buf = bytearray()
+        self._stream_flush_bytes = 4096 * 2
+        # Eventos de controle são imutáveis por formato: construir uma vez
+        self._start_events: dict = {}
+        self._stop_event = AudioStop().event()
+
+    def _audio_start_event(self, rate: int, width: int, channels: int):
+        """Evento AudioStart cacheado por formato de áudio"""
+        key = (rate, width, channels)
+        event = self._start_events.get(key)
+        if event is None:
+            event = AudioStart(rate=rate, width=width, channels=channels).event()
+            self._start_events[key] = event
+        return event
+
+    @staticmethod
+    def _tune_socket(client):
+        """
+        Ajusta o socket TCP por baixo do AsyncClient (best effort):
+        TCP_NODELAY evita o atraso de Nagle nos eventos de controle,
+        buffers de 256KiB deixam o kernel absorver o enunciado inteiro
+        e keepalive detecta conexões mortas sem custo por enunciado
+        """
+        try:
+            writer = getattr(client, "_writer", None)
+            sock = writer.get_extra_info("socket") if writer else None
+            if sock is not None:
+                sock.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+                sock.setsockopt(socket.SOL_SOCKET, socket.SO_SNDBUF, 1 << 18)
+                sock.setsockopt(socket.SOL_SOCKET, socket.SO_RCVBUF, 1 << 18)
+                sock.setsockopt(socket.SOL_SOCKET, socket.SO_KEEPALIVE, 1)
+        except OSError as e:
+            logger.debug(f"Socket tuning skipped: {e}")
+
+    async def _ensure_connected(self) -> AsyncClient:
+        """Conecta ao Wyoming se ainda não houver conexão ativa"""
+        if self._client is None:
+            logger.debug(f"📨 Connecting to Wyoming at {self.uri}")
+            client = AsyncClient.from_uri(self.uri)
+            await client.connect()
+            self._tune_socket(client)
+            self._client = client
+            logger.info(f"✅ Connected to Wyoming server")
+        return self._client
+
+    async def disconnect(self):
+        """Fecha a conexão atual (a próxima chamada reconecta)"""
+        if self._client is not None:
+            try:
+                await self._client.disconnect()
+            except Exception:
+                pass
+            self._client = None
+
     async def send_audio(self, audio_data: bytes, sample_rate: int = 16000, sample_width: int = 2, channels: int = 1) -> Optional[str]:
         """
         Envia áudio para Wyoming e recebe transcrição usando protocolo oficial
         """
+        async with self._lock:
+            return await self._send_audio(audio_data, sample_rate, sample_width, channels)
+
+    async def _send_audio(self, audio_data: bytes, sample_rate: int, sample_width: int, channels: int) -> Optional[str]:
         try:
-            logger.debug(f"📨 Connecting to Wyoming at {self.uri}")
-            
-            async with AsyncClient.from_uri(self.uri) as client:
-                logger.info(f"✅ Connected to Wyoming server")
-                
-                # Padrão Wyoming Satellite: AudioStart → AudioChunk(s) → AudioStop
-                # NÃO envia Transcribe (isso é para clientes ASR diretos)
-                
-                # 1. Enviar AudioStart
-                await client.write_event(
-                    AudioStart(
-                        rate=sample_rate,
-                        width=sample_width,
-                        channels=channels
-                    ).event()
-                )
-                logger.debug(f"📨 AudioStart (rate={sample_rate}Hz, {sample_width}B, {channels}ch)")
-                
-                # 2. Enviar áudio em chunks (padrão satellite: 1024 samples)
-                chunk_size = 1024 * sample_width * channels
-                total_chunks = (len(audio_data) + chunk_size - 1) // chunk_size
-                chunks_sent = 0
-                for i in range(0, len(audio_data), chunk_size):
-                    chunk = audio_data[i:i + chunk_size]
-                    await client.write_event(
-                        AudioChunk(
-                            rate=sample_rate,
-                            width=sample_width,
-                            channels=channels,
-                            audio=chunk
-                        ).event()
-                    )
-                    chunks_sent += 1
-                    
-                    # Log a cada 10 chunks ou no último
-                    if chunks_sent % 10 == 0 or chunks_sent == total_chunks:
-                        logger.debug(f"📦 Chunk {chunks_sent}/{total_chunks}")
-                
-                logger.debug(f"📦 {chunks_sent} chunks sent ({len(audio_data)} bytes)")
-                
-                # 3. Sinalizar fim do áudio
-                await client.write_event(AudioStop().event())
-                logger.info("🛑 AudioStop sent - waiting for transcript...")
-                
-                # 4. Aguardar resposta Transcript (como Wyoming Satellite)
-                # Timeout ajustado baseado no tamanho do áudio (1s por 2s de áudio, min 30s, max 60s)
-                audio_duration = len(audio_data) / (16000 * 2)  # 16kHz, 2 bytes per sample
-                timeout = max(30.0, min(60.0, audio_duration * 0.5))
-                logger.debug(f"⏱️  Waiting for transcript (timeout: {timeout:.1f}s for {audio_duration:.1f}s audio)")
-                start_time = asyncio.get_event_loop().time()
-                
-                while True:
-                    if asyncio.get_event_loop().time() - start_time > timeout:
-                        logger.warning(f"⏰ Timeout after {timeout}s")
+            client = await self._ensure_connected()
+
+            # Padrão Wyoming Satellite: AudioStart → AudioChunk(s) → AudioStop
+            # NÃO envia Transcribe (isso é para clientes ASR diretos)
+
+            # 1. Enviar AudioStart
+            await client.write_event(self._audio_start_event(sample_rate, sample_width, channels))
+            logger.debug(f"📨 AudioStart (rate={sample_rate}Hz, {sample_width}B, {channels}ch)")
+
+            # 2. Enviar o áudio inteiro em um único AudioChunk
+            # Whisper precisa da fala completa antes de decodificar, então
+            # não há ganho em fatiar: um evento só = 1 header JSON + 1 write
+            # em vez de ~20 encodes/syscalls por enunciado
+            await client.write_event(
+                AudioChunk(
+                    rate=sample_rate,
+                    width=sample_width,
+                    channels=channels,
+                    audio=audio_data
+                ).event()
+            )
+            logger.debug(f"📦 Audio sent in single chunk ({len(audio_data)} bytes)")
+
+            # 3. Sinalizar fim do áudio
+            await client.write_event(self._stop_event)
+            logger.info("🛑 AudioStop sent - waiting for transcript...")
+
+            # 4. Aguardar resposta Transcript (como Wyoming Satellite)
+            # Timeout ajustado baseado no tamanho do áudio (1s por 2s de áudio, min 30s, max 60s)
+            audio_duration = len(audio_data) / (sample_rate * sample_width)
+            timeout = max(30.0, min(60.0, audio_duration * 0.5))
+            return await self._read_transcript(client, timeout)
+
+        except (ConnectionError, OSError) as e:
+            logger.error(f"❌ Wyoming connection error: {e}")
+            await self.disconnect()
+            return None
+        except Exception as e:
+            logger.error(f"❌ Error communicating with Wyoming: {e}")
+            logger.exception(e)
+            return None
+
+    async def _read_transcript(self, client: AsyncClient, timeout: float) -> Optional[str]:
+        """Aguarda o evento Transcript na conexão (como Wyoming Satellite)"""
+        logger.debug(f"⏱️  Waiting for transcript (timeout: {timeout:.1f}s)")
+
+        async def _wait() -> Optional[str]:
+            while True:
+                event = await client.read_event()
+
+                if event is None:
+                    logger.debug("⚠️  Connection closed without response")
+                    await self.disconnect()
+                    return None
+
+                if Transcript.is_type(event.type):
+                    transcript = Transcript.from_event(event)
+                    text = transcript.text.strip()
+
+                    if text:
+                        logger.debug(f"📥 Received transcript: '{text}'")
+                        return text
+                    else:
+                        logger.debug("📥 Received empty transcript")
                         return None
-                    
-                    event = await asyncio.wait_for(client.read_event(), timeout=5.0)
-                    
-                    if event is None:
-                        logger.debug("⚠️  Connection closed without response")
-                        break
-                    
-                    if Transcript.is_type(event.type):
-                        transcript = Transcript.from_event(event)
-                        text = transcript.text.strip()
-                        
-                        if text:
-                            logger.debug(f"� Received transcript: '{text}'")
-                            return text
-                        else:
-                            logger.debug("📥 Received empty transcript")
-                            return None
-                
-                logger.debug("⚠️  No transcript received")
-                return None
-                
+
+        # Um único timer para a espera toda, em vez de checar o relógio a
+        # cada iteração com um sub-timeout de 5s que mascarava travamentos
+        try:
+            return await asyncio.wait_for(_wait(), timeout=timeout)
         except asyncio.TimeoutError:
-            logger.error("⏰ Timeout waiting for response from Wyoming (>30s)")
+            logger.warning(f"⏰ Timeout after {timeout}s")
+            # Estado do protocolo desconhecido após timeout: reconectar
+            await self.disconnect()
+            return None
+
+    # --- Modo streaming: envia o enunciado enquanto ele acontece -----------
+    # O stream abre no início da fala detectada pelo VAD e os frames são
+    # encaminhados ao vivo; no fim da fala só falta o AudioStop, tirando a
+    # transferência do enunciado inteiro do caminho crítico da transcrição.
+
+    async def begin_utterance(self, sample_rate: int = 16000, sample_width: int = 2, channels: int = 1) -> bool:
+        """Abre um enunciado streaming enviando AudioStart"""
+        if self._streaming:
+            await self.abort_utterance()
+
+        await self._lock.acquire()
+        # O lock só fica retido se o enunciado abrir de fato: QUALQUER saída
+        # sem _streaming=True (erro de conexão, cancelamento, exceção
+        # inesperada) solta o lock, senão o próximo enunciado trava para sempre
+        opened = False
+        try:
+            self._stream_params = (sample_rate, sample_width, channels)
+            self._streamed_bytes = 0
+            self._stream_buf.clear()
+            client = await self._ensure_connected()
+            await client.write_event(self._audio_start_event(sample_rate, sample_width, channels))
+            logger.debug(f"📨 AudioStart (rate={sample_rate}Hz, {sample_width}B, {channels}ch)")
+            self._streaming = True
+            opened = True
+            return True
+        except (ConnectionError, OSError) as e:
+            logger.error(f"❌ Wyoming connection error: {e}")
+            await self.disconnect()
+            return False
+        finally:
+            if not opened:
+                self._lock.release()
+
+    async def stream_chunk(self, chunk: bytes) -> bool:
+        """Encaminha um pedaço de áudio do enunciado em andamento"""
+        if not self._streaming:
+            return False
+
+        self._stream_buf += chunk
+        if len(self._stream_buf) < self._stream_flush_bytes:
+            return True
+        return await self._flush_stream_buf()
+
+    async def _flush_stream_buf(self) -> bool:
+        """Escreve o áudio coalescido pendente como um AudioChunk"""
+        if not self._stream_buf:
+            return True
+
+        try:
+            rate, width, channels = self._stream_params
+            await self._client.write_event(
+                AudioChunk(
+                    rate=rate,
+                    width=width,
+                    channels=channels,
+                    audio=bytes(self._stream_buf)
+                ).event()
+            )
+            self._streamed_bytes += len(self._stream_buf)
+            self._stream_buf.clear()
+            return True
+        except (ConnectionError, OSError) as e:
+            logger.error(f"❌ Wyoming connection error: {e}")
+            await self.abort_utterance()
+            return False
+
+    async def end_utterance(self) -> Optional[str]:
+        """Fecha o enunciado (AudioStop) e aguarda a transcrição"""
+        if not self._streaming:
+            return None
+
+        # Resto coalescido ainda não enviado (pode abortar o enunciado)
+        if not await self._flush_stream_buf():
+            return None
+
+        try:
+            client = self._client
+            await client.write_event(self._stop_event)
+            logger.info("🛑 AudioStop sent - waiting for transcript...")
+
+            rate, width, _ = self._stream_params
+            audio_duration = self._streamed_bytes / (rate * width)
+            timeout = max(30.0, min(60.0, audio_duration * 0.5))
+            return await self._read_transcript(client, timeout)
+        except (ConnectionError, OSError) as e:
+            logger.error(f"❌ Wyoming connection error: {e}")
+            await self.disconnect()
             return None
         except Exception as e:
             logger.error(f"❌ Error communicating with Wyoming: {e}")
             logger.exception(e)
             return None
+        finally:
+            self._streaming = False
+            self._lock.release()
+
+    async def abort_utterance(self):
+        """Cancela um enunciado em andamento (conexão fica inválida)"""
+        if not self._streaming:
+            return
+        self._streaming = False
+        await self.disconnect()
+        self._lock.release()
 
 
 class AudioBuffer:
     """Buffer para acumular áudio com VAD (Voice Activity Detection)"""
     
-    def __init__(self, sample_rate: int = 16000, vad_threshold: float = 0.5):
+    def __init__(self, sample_rate: int = 16000, vad_threshold: float = 0.5,
+                 silence_peak_threshold: int = 200, streaming: bool = False):
+        # streaming=True: em vez de acumular o enunciado, add_block emite
+        # eventos ("start"/"audio"/"end") para envio ao vivo ao Wyoming
+        self.streaming = streaming
+        # Validar uma vez aqui: o webrtcvad só aceita estas taxas, e checar
+        # no __init__ dispensa try/except por frame no caminho quente
+        if sample_rate not in (8000, 16000, 32000, 48000):
+            raise ValueError(
+                f"sample_rate inválido para VAD: {sample_rate} "
+                "(use 8000, 16000, 32000 ou 48000)"
+            )
         self.sample_rate = sample_rate
-        self.buffer = []
+        self.frame_samples = int(sample_rate * 0.03)  # 480 samples = 30ms
+        self.frame_bytes = self.frame_samples * 2  # s16 = 2 bytes por sample
         self.vad = webrtcvad.Vad(3)  # Agressividade MÁXIMA (0-3) para reduzir false positives
         self.vad_threshold = vad_threshold
         self.is_speaking = False
@@ -143,78 +336,166 @@ class AudioBuffer:
         self.max_recording_frames = 1000  # Máximo 30s de gravação (1000 frames × 30ms)
         self.recorded_frames = 0
         self.min_energy_threshold = 500  # Energia mínima para considerar como voz real (rejeita TV/rádio distante)
-        
+        self.silence_peak_threshold = silence_peak_threshold  # Pico abaixo disso nem chama o VAD
+        # Buffer contíguo pré-alocado (30s de s16) — sem realloc nem join por enunciado
+        self._buf = bytearray(self.max_recording_frames * self.frame_bytes)
+        self._pos = 0
+        # Sobra de samples (< 1 frame) do bloco anterior, para não descartar áudio
+        self._leftover = np.empty(0, dtype=np.int16)
+        # Cauda de silêncio retida: frames de silêncio só entram no enunciado
+        # se a fala retomar; ao finalizar, só um padding curto é mantido
+        self._tail = deque(maxlen=self.max_silence_frames)
+        self.tail_padding_frames = 5  # ~150ms de silêncio final (Whisper precisa de um respiro)
+
     def _calculate_energy(self, frame: bytes) -> float:
-        """Calcula energia RMS do frame de áudio"""
-        import array
-        samples = array.array('h', frame)  # 16-bit signed integers
-        sum_squares = sum(s * s for s in samples)
-        return (sum_squares / len(samples)) ** 0.5 if samples else 0
-        
-    def add_frame(self, frame: bytes) -> Optional[bytes]:
+        """Calcula energia RMS do frame de áudio (vetorizado com numpy)"""
+        x = np.frombuffer(frame, dtype=np.int16)
+        if x.size == 0:
+            return 0.0
+        # np.square com dtype explícito evita overflow de int16 ao quadrado
+        return float(np.sqrt(np.square(x, dtype=np.float32).mean()))
+
+    def _write(self, data: bytes):
+        """Escreve bytes PCM no buffer pré-alocado, crescendo só se necessário"""
+        end = self._pos + len(data)
+        if end > len(self._buf):
+            self._buf.extend(bytes(end - len(self._buf)))
+        self._buf[self._pos:end] = data
+        self._pos = end
+
+    def take(self) -> bytes:
+        """Devolve o conteúdo acumulado como bytes e reseta o buffer"""
+        data = bytes(memoryview(self._buf)[:self._pos])
+        self.reset()
+        return data
+
+    def _speech_mask(self, frames: np.ndarray, frame_bytes: list) -> np.ndarray:
+        """Calcula máscara booleana de fala para um bloco de frames de 30ms"""
+        mask = np.zeros(len(frame_bytes), dtype=bool)
+
+        # Pré-filtro vetorizado: pico absoluto por frame em um passe numpy
+        # (SIMD); silêncio óbvio (noite, stream parado) nem chega ao VAD
+        peaks = np.max(np.abs(frames), axis=1)
+
+        # Sem try/except por frame: taxa e tamanho de frame são validados
+        # no __init__, então is_speech não tem como falhar aqui
+        for idx in np.flatnonzero(peaks > self.silence_peak_threshold):
+            mask[idx] = self.vad.is_speech(frame_bytes[idx], self.sample_rate)
+        return mask
+
+    def add_block(self, block: np.ndarray) -> list:
         """
-        Adiciona frame de áudio ao buffer
-        Retorna áudio completo quando detectar fim da fala
+        Processa um bloco inteiro de samples int16 (saída do resampler)
+        Retorna lista de eventos (kind, payload):
+          - ("utterance", bytes): enunciado completo (modo bufferizado)
+          - ("start", None) / ("audio", bytes) / ("end", None): modo streaming
         """
-        # Verificar atividade de voz (frame deve ter 10, 20 ou 30ms a 8/16/32kHz)
-        try:
-            is_speech = self.vad.is_speech(frame, self.sample_rate)
-        except:
-            is_speech = True  # Se VAD falhar, assume que é fala
-        
-        # FILTRO DE ENERGIA: Rejeitar áudio de TV/rádio distante
-        energy = self._calculate_energy(frame)
-        if is_speech and energy < self.min_energy_threshold:
-            logger.debug(f"🔇 Low energy audio rejected: {energy:.0f} < {self.min_energy_threshold}")
-            is_speech = False
-        
+        events = []
+
+        # Emendar a sobra do bloco anterior (frames parciais não são descartados)
+        if self._leftover.size:
+            block = np.concatenate((self._leftover, block))
+
+        n_frames = block.size // self.frame_samples
+        self._leftover = block[n_frames * self.frame_samples:]
+        if n_frames == 0:
+            return events
+
+        # Fatiar em frames de 30ms via reshape (sem loop de slicing em bytes)
+        frames = block[:n_frames * self.frame_samples].reshape(n_frames, self.frame_samples)
+        # Materializar bytes uma única vez por frame (VAD e buffer compartilham)
+        frame_bytes = [frames[idx].tobytes() for idx in range(n_frames)]
+        mask = self._speech_mask(frames, frame_bytes)
+
+        # Fast path: fora de um enunciado, um bloco sem nenhuma fala não
+        # muda estado algum — pula a máquina de estados frame a frame
+        if not self.is_speaking and not mask.any():
+            return events
+
+        for idx in range(n_frames):
+            self._advance(frame_bytes[idx], bool(mask[idx]), events)
+        return events
+
+    def _emit_audio(self, frame: bytes, events: list):
+        """Encaminha o frame: evento ao vivo (streaming) ou buffer local"""
+        if self.streaming:
+            events.append(("audio", frame))
+        else:
+            self._write(frame)
+
+    def _finish(self, events: list):
+        """Fecha o enunciado atual emitindo o evento adequado ao modo"""
+        if self.streaming:
+            self.reset()
+            events.append(("end", None))
+        else:
+            events.append(("utterance", self.take()))
+
+    def _advance(self, frame: bytes, is_speech: bool, events: list):
+        """Avança a máquina de estados com um frame de 30ms já classificado"""
+        if is_speech and not self.is_speaking:
+            # FILTRO DE ENERGIA só no início do enunciado: é aí que TV/rádio
+            # distante engana o VAD; durante fala ativa o cálculo é desperdício
+            energy = self._calculate_energy(frame)
+            if energy < self.min_energy_threshold:
+                logger.debug("🔇 Low energy audio rejected: %.0f < %d", energy, self.min_energy_threshold)
+                is_speech = False
+
         if is_speech:
             if not self.is_speaking:
                 logger.info("🎤 Voice activity detected - Recording started")
                 self.recorded_frames = 0
+                if self.streaming:
+                    events.append(("start", None))
             self.is_speaking = True
             self.silence_frames = 0
-            self.buffer.append(frame)
+            # Fala retomou: o silêncio retido faz parte do enunciado
+            while self._tail:
+                self._emit_audio(self._tail.popleft(), events)
+            self._emit_audio(frame, events)
             self.recorded_frames += 1
-            
+
             # LIMITE MÁXIMO: Forçar finalização após 30s
             if self.recorded_frames >= self.max_recording_frames:
-                audio_data = b"".join(self.buffer)
-                duration_seconds = len(audio_data) / (self.sample_rate * 2)
-                logger.warning(f"⚠️  Max recording duration reached! Forcing stop: {duration_seconds:.2f}s, {len(audio_data)} bytes")
-                self.reset()
-                return audio_data
+                duration_seconds = self.recorded_frames * 0.03
+                logger.warning(f"⚠️  Max recording duration reached! Forcing stop: {duration_seconds:.2f}s")
+                self._finish(events)
+                return
             
             # Log periódico durante gravação
             if self.recorded_frames % 50 == 0:
-                duration = self.recorded_frames * 0.03
-                logger.debug(f"📼 Recording... {duration:.1f}s ({self.recorded_frames}/{self.max_recording_frames} frames)")
+                logger.debug("📼 Recording... %.1fs (%d/%d frames)",
+                             self.recorded_frames * 0.03, self.recorded_frames, self.max_recording_frames)
         elif self.is_speaking:
             self.silence_frames += 1
-            self.buffer.append(frame)
-            
+            # Retém o frame: silêncio de cauda só vira áudio se a fala retomar
+            self._tail.append(frame)
+
             # Log de silêncio
             if self.silence_frames == 1:
-                logger.debug(f"🔇 Silence started (frames: {len(self.buffer)})")
-            
+                logger.debug("🔇 Silence started (frames: %d)", self.recorded_frames)
+
             # Se silêncio durar muito, considera que a fala terminou
             if self.silence_frames >= self.max_silence_frames:
-                audio_data = b"".join(self.buffer)
-                duration_seconds = len(audio_data) / (self.sample_rate * 2)  # 2 bytes per sample
-                logger.info(f"✅ Recording complete: {duration_seconds:.2f}s, {len(audio_data)} bytes, silence frames: {self.silence_frames}")
-                self.reset()
-                return audio_data
+                duration_seconds = (self.recorded_frames + self.silence_frames) * 0.03
+                logger.info(f"✅ Recording complete: {duration_seconds:.2f}s, silence frames: {self.silence_frames}")
+                # Só um padding curto de silêncio entra no enunciado final
+                for _ in range(self.tail_padding_frames):
+                    if not self._tail:
+                        break
+                    self._emit_audio(self._tail.popleft(), events)
+                self._tail.clear()
+                self._finish(events)
             elif self.silence_frames % 10 == 0:
-                logger.debug(f"🔇 Silence continuing... {self.silence_frames}/{self.max_silence_frames} frames")
-        
-        return None
+                logger.debug("🔇 Silence continuing... %d/%d frames", self.silence_frames, self.max_silence_frames)
     
     def reset(self):
-        """Reseta o buffer"""
-        self.buffer = []
+        """Reseta o buffer (mantém a alocação, só volta o cursor)"""
+        self._pos = 0
         self.is_speaking = False
         self.silence_frames = 0
         self.recorded_frames = 0
+        self._tail.clear()
 
 
 class ONVIFVoiceAssistant:
@@ -222,16 +503,72 @@ class ONVIFVoiceAssistant:
     
     def __init__(self, config: dict):
         self.config = config
+        self._sample_rate = config["sample_rate"]
         self.wyoming_client = WyomingClient(
             config["wyoming_host"],
             config["wyoming_port"]
         )
         self.audio_buffer = AudioBuffer(
             sample_rate=config["sample_rate"],
-            vad_threshold=config.get("vad_threshold", 0.5)
+            vad_threshold=config.get("vad_threshold", 0.5),
+            silence_peak_threshold=config.get("silence_peak_threshold", 200),
+            streaming=config.get("vad_enabled", True)
         )
         self.running = False
-        
+        # Sessão HTTP persistente para a API do Home Assistant (reusa conexão TCP)
+        self._http: Optional[aiohttp.ClientSession] = None
+        # Pré-compilar padrões de comando (lowercase + split uma vez no startup,
+        # não a cada transcrição)
+        self._commands = []
+        for command in config.get("commands", []):
+            pattern = command["pattern"].lower().strip()
+            pattern_words = tuple(pattern.split())
+            command["_actions"] = self._normalize_actions(command)
+            self._commands.append((pattern, pattern_words, frozenset(pattern_words), command))
+        # Token e headers do HA resolvidos uma vez no startup
+        self._ha_timeout = aiohttp.ClientTimeout(total=10)
+        self._ha_token = os.environ.get('SUPERVISOR_TOKEN') or os.environ.get('HASSIO_TOKEN')
+        self._ha_headers = {
+            "Authorization": f"Bearer {self._ha_token}",
+            "Content-Type": "application/json"
+        }
+
+    @staticmethod
+    def _normalize_actions(command: dict) -> list:
+        """
+        Normaliza 'action' (formato antigo) e 'actions' (lista) para uma
+        lista de ações com URL e service_data já resolvidos no startup
+        """
+        # Suporte para formato antigo (action único) e novo (actions lista)
+        if "actions" in command:
+            actions_list = command["actions"]
+            if not isinstance(actions_list, list):
+                actions_list = [actions_list]
+        elif "action" in command:
+            # Formato antigo: converter para lista
+            actions_list = [{
+                "action": command["action"],
+                "entity_id": command.get("entity_id"),
+                "service_data": command.get("service_data", {})
+            }]
+        else:
+            return []
+
+        for action_config in actions_list:
+            action = action_config.get("action") or ""
+            # Dividir action em domain e service (ex: "light.turn_on" -> "light", "turn_on")
+            if "." in action:
+                domain, service = action.split(".", 1)
+                # URL correta da API do Home Assistant via Supervisor
+                action_config["_url"] = f"http://supervisor/core/api/services/{domain}/{service}"
+
+            service_data = action_config.get("service_data") or {}
+            if isinstance(service_data, str):
+                service_data = _json_loads(service_data)
+            action_config["_service_data"] = service_data
+
+        return actions_list
+
     async def start(self):
         """Inicia o assistente"""
         logger.info("Starting ONVIF Voice Assistant...")
@@ -239,250 +576,316 @@ class ONVIFVoiceAssistant:
         logger.info(f"Wyoming server: {self.config['wyoming_host']}:{self.config['wyoming_port']}")
         
         self.running = True
-        
-        while self.running:
-            try:
-                await self._process_audio_stream()
-            except Exception as e:
-                logger.error(f"Error processing audio stream: {e}")
-                logger.info("Reconnecting in 5 seconds...")
-                await asyncio.sleep(5)
+        self._http = aiohttp.ClientSession()
+
+        try:
+            while self.running:
+                try:
+                    await self._process_audio_stream()
+                except Exception as e:
+                    logger.error(f"Error processing audio stream: {e}")
+                    logger.info("Reconnecting in 5 seconds...")
+                    await asyncio.sleep(5)
+        finally:
+            await self.wyoming_client.disconnect()
+            await self._http.close()
+            self._http = None
     
+    def _rtsp_worker(self, loop: asyncio.AbstractEventLoop, queue: asyncio.Queue, error: list):
+        """
+        Thread dedicada: demux/decode/resample do RTSP (chamadas C bloqueantes)
+        Empurra blocos int16 para a fila do event loop
+        """
+        try:
+            logger.info("Opening RTSP stream...")
+
+            # Abrir stream RTSP com PyAV
+            container = av.open(self.config["rtsp_url"], options={
+                'rtsp_transport': 'tcp',
+                'stimeout': '5000000',  # 5 segundos timeout
+                'buffer_size': '1048576',
+                'reorder_queue_size': '0',  # TCP não reordena, fila é só latência
+                'fflags': 'nobuffer'  # não segurar pacotes para probing
+            })
+
+            # Encontrar stream de áudio
+            audio_stream = None
+            for stream in container.streams:
+                if stream.type == 'audio':
+                    audio_stream = stream
+                    break
+
+            if not audio_stream:
+                raise Exception("No audio stream found in RTSP source")
+
+            # Decode com threads do FFmpeg
+            audio_stream.thread_type = 'AUTO'
+            audio_stream.codec_context.thread_count = 2
+
+            logger.info(f"Audio stream found: {audio_stream.codec_context.name}, "
+                       f"{audio_stream.codec_context.sample_rate}Hz, "
+                       f"{audio_stream.codec_context.channels} channels")
+
+            # Configurar resampler para 16kHz mono (formato esperado pelo Whisper)
+            # Se a câmera já entrega o formato alvo, pular o libswresample
+            # (maior custo de CPU por pacote no ingest contínuo)
+            ctx = audio_stream.codec_context
+            if (ctx.sample_rate == self._sample_rate
+                    and ctx.channels == 1
+                    and ctx.format is not None
+                    and ctx.format.name in ('s16', 's16p')):
+                resampler = None
+                logger.info("Source already matches target format - resampler bypassed")
+            else:
+                resampler = av.audio.resampler.AudioResampler(
+                    format='s16',
+                    layout='mono',
+                    rate=self._sample_rate
+                )
+
+            logger.info("Processing audio stream...")
+
+            # FIFO acumula frames resampleados (~20ms cada) e entrega blocos
+            # grandes, amortizando o custo Python por frame do PyAV
+            fifo = av.AudioFifo()
+            block_samples = self.audio_buffer.frame_samples * 33  # ~1s por bloco
+
+            for packet in container.demux(audio_stream):
+                if not self.running:
+                    break
+
+                for frame in packet.decode():
+                    # Resample para formato correto (ou passa direto)
+                    resampled = resampler.resample(frame) if resampler else (frame,)
+                    for resampled_frame in resampled:
+                        resampled_frame.pts = None  # FIFO não exige pts contíguo
+                        fifo.write(resampled_frame)
+
+                # Drenar blocos completos do FIFO: view int16 direto sobre o
+                # plano do frame (sem a cópia extra do to_ndarray)
+                while (out := fifo.read(block_samples)) is not None:
+                    block = np.frombuffer(out.planes[0], dtype=np.int16)[:out.samples]
+                    # put() com backpressure: bloqueia a thread se a fila encher
+                    asyncio.run_coroutine_threadsafe(queue.put(block), loop).result()
+
+            # Flush do resto do FIFO ao encerrar
+            out = fifo.read()
+            if out is not None:
+                block = np.frombuffer(out.planes[0], dtype=np.int16)[:out.samples]
+                asyncio.run_coroutine_threadsafe(queue.put(block), loop).result()
+
+            container.close()
+        except Exception as e:
+            error.append(e)
+        finally:
+            # Sentinela: avisa o consumidor que o stream acabou. Fire-and-
+            # forget (sem .result()): esperar aqui deadlockava com o join()
+            # do consumidor, e um put_nowait perderia a sentinela com a
+            # fila cheia, deixando o consumidor surdo para sempre
+            asyncio.run_coroutine_threadsafe(queue.put(None), loop)
+
     async def _process_audio_stream(self):
         """Processa stream de áudio da câmera ONVIF"""
-        logger.info("Opening RTSP stream...")
-        
-        # Abrir stream RTSP com PyAV
-        container = av.open(self.config["rtsp_url"], options={
-            'rtsp_transport': 'tcp',
-            'stimeout': '5000000'  # 5 segundos timeout
-        })
-        
-        # Encontrar stream de áudio
-        audio_stream = None
-        for stream in container.streams:
-            if stream.type == 'audio':
-                audio_stream = stream
-                break
-        
-        if not audio_stream:
-            raise Exception("No audio stream found in RTSP source")
-        
-        logger.info(f"Audio stream found: {audio_stream.codec_context.name}, "
-                   f"{audio_stream.codec_context.sample_rate}Hz, "
-                   f"{audio_stream.codec_context.channels} channels")
-        
-        # Configurar resampler para 16kHz mono (formato esperado pelo Whisper)
-        resampler = av.audio.resampler.AudioResampler(
-            format='s16',
-            layout='mono',
-            rate=self.config["sample_rate"]
+        loop = asyncio.get_running_loop()
+        # Cada item é um bloco de ~1s do FIFO; 4 blocos de folga aplicam
+        # backpressure perto do tempo real se o consumidor atrasar
+        queue: asyncio.Queue = asyncio.Queue(maxsize=4)
+        error: list = []
+
+        worker = threading.Thread(
+            target=self._rtsp_worker,
+            args=(loop, queue, error),
+            name="rtsp-worker",
+            daemon=True
         )
-        
-        logger.info("Processing audio stream...")
-        
-        frame_count = 0
-        vad_check_count = 0
-        
-        for packet in container.demux(audio_stream):
-            if not self.running:
-                break
-                
-            for frame in packet.decode():
-                # Resample para formato correto
-                resampled_frames = resampler.resample(frame)
-                
-                for resampled_frame in resampled_frames:
-                    # Converter para bytes PCM
-                    audio_bytes = resampled_frame.to_ndarray().tobytes()
-                    
-                    # Processar em chunks de 30ms (480 samples a 16kHz)
-                    frame_size = int(self.config["sample_rate"] * 0.03) * 2  # 2 bytes por sample
-                    
-                    for i in range(0, len(audio_bytes), frame_size):
-                        chunk = audio_bytes[i:i + frame_size]
-                        
-                        if len(chunk) < frame_size:
-                            continue
-                        
-                        frame_count += 1
-                        
-                        # Log inicial para debug
-                        if frame_count == 1:
-                            logger.debug(f"📊 Frame size: {frame_size} bytes ({frame_size//2} samples = 30ms)")
-                        
-                        # VAD e buffer
-                        if self.config.get("vad_enabled", True):
-                            vad_check_count += 1
-                            
-                            # Log periódico para confirmar que está processando
-                            if vad_check_count % 1000 == 0:
-                                logger.debug(f"📡 Processed {vad_check_count} VAD checks ({vad_check_count * 0.03:.0f}s of audio)")
-                            
-                            complete_audio = self.audio_buffer.add_frame(chunk)
-                            
-                            if complete_audio:
-                                # Enviar para transcrição
-                                await self._transcribe_and_process(complete_audio)
-                        else:
-                            # Sem VAD, acumular por tempo fixo
-                            self.audio_buffer.buffer.append(chunk)
-                            
-                            # Processar a cada X segundos
-                            buffer_duration = len(self.audio_buffer.buffer) * 0.03
-                            chunk_target = self.config.get("chunk_duration", 2)
-                            
-                            if buffer_duration >= chunk_target:
-                                complete_audio = b"".join(self.audio_buffer.buffer)
-                                logger.debug(f"🎵 Accumulated {buffer_duration:.1f}s of audio (target: {chunk_target}s)")
-                                self.audio_buffer.reset()
-                                await self._transcribe_and_process(complete_audio)
-        
-        container.close()
+        worker.start()
+
+        # Constantes do loop quente resolvidas uma vez (sem dict lookup por bloco)
+        vad_enabled = self.config.get("vad_enabled", True)
+        chunk_target = self.config.get("chunk_duration", 2)
+        sample_rate = self._sample_rate
+        bytes_per_second = sample_rate * 2
+        chunk_target_bytes = chunk_target * bytes_per_second
+        audio_buffer = self.audio_buffer
+        frame_samples = audio_buffer.frame_samples
+        accumulated_bytes = 0
+        frames_processed = 0
+
+        try:
+            while True:
+                block = await queue.get()
+                if block is None:
+                    break
+
+                if vad_enabled:
+                    # VAD em bloco: máscara calculada de uma vez por bloco;
+                    # eventos de streaming são encaminhados ao vivo ao Wyoming
+                    for kind, payload in audio_buffer.add_block(block):
+                        if kind == "start":
+                            await self.wyoming_client.begin_utterance(sample_rate)
+                        elif kind == "audio":
+                            await self.wyoming_client.stream_chunk(payload)
+                        elif kind == "end":
+                            text = await self.wyoming_client.end_utterance()
+                            await self._handle_transcript(text)
+                        elif kind == "utterance":
+                            await self._transcribe_and_process(payload)
+
+                    # Log periódico para confirmar que está processando
+                    frames_processed += block.size // frame_samples
+                    if frames_processed >= 1000:
+                        logger.debug("📡 Processed ~%.0fs of audio through VAD", frames_processed * 0.03)
+                        frames_processed = 0
+                else:
+                    # Sem VAD, acumular por tempo fixo
+                    audio_buffer._write(block.tobytes())
+                    accumulated_bytes += block.size * 2
+
+                    # Processar a cada X segundos
+                    if accumulated_bytes >= chunk_target_bytes:
+                        logger.debug("🎵 Accumulated %.1fs of audio (target: %ss)",
+                                     accumulated_bytes / bytes_per_second, chunk_target)
+                        complete_audio = audio_buffer.take()
+                        accumulated_bytes = 0
+                        await self._transcribe_and_process(complete_audio)
+        finally:
+            # Drenar a fila libera um put() pendente do worker se o consumidor
+            # saiu por exceção; o join roda fora do loop para não congelá-lo
+            while not queue.empty():
+                queue.get_nowait()
+            await asyncio.to_thread(worker.join, 5)
+            if worker.is_alive():
+                logger.warning("⚠️  RTSP worker still alive after join timeout - "
+                               "thread and container leaked until stream ends")
+
+        if error:
+            raise error[0]
     
     async def _transcribe_and_process(self, audio_data: bytes):
         """Transcreve áudio e processa comandos"""
         try:
-            duration = len(audio_data) / (self.config["sample_rate"] * 2)
-            logger.debug(f"📤 Sending audio to Wyoming: {len(audio_data)} bytes ({duration:.2f}s)")
-            
+            duration = len(audio_data) / (self._sample_rate * 2)
+            logger.debug("📤 Sending audio to Wyoming: %d bytes (%.2fs)", len(audio_data), duration)
+
             # Enviar para Wyoming Whisper (agora é async)
             text = await self.wyoming_client.send_audio(
                 audio_data,
-                self.config["sample_rate"]
+                self._sample_rate
             )
-            
-            if text:
-                text = text.strip().lower()
-                logger.info(f"✅ Recognized text: '{text}'")
-                
-                # Processar comandos
-                await self._process_command(text)
-            else:
-                logger.debug("⚠️  No text recognized (empty or failed transcription)")
-                
+            await self._handle_transcript(text)
+
         except Exception as e:
             logger.error(f"Error transcribing audio: {e}")
+
+    async def _handle_transcript(self, text: Optional[str]):
+        """Processa o texto transcrito (streaming ou bufferizado)"""
+        if text:
+            text = text.strip().lower()
+            logger.info(f"✅ Recognized text: '{text}'")
+
+            # Processar comandos
+            await self._process_command(text)
+        else:
+            logger.debug("⚠️  No text recognized (empty or failed transcription)")
     
     async def _process_command(self, text: str):
         """Processa comandos reconhecidos"""
-        commands = self.config.get("commands", [])
-        
-        logger.debug(f"🔍 Checking {len(commands)} command patterns for: '{text}'")
-        
+        logger.debug("🔍 Checking %d command patterns for: '%s'", len(self._commands), text)
+
         # Normalizar texto (remover pontuação final)
         text_clean = text.strip().rstrip('.,!?')
-        
-        for command in commands:
-            pattern = command["pattern"].lower().strip()
-            
+        text_words = text_clean.split()
+        word_set = set(text_words)
+
+        for pattern, pattern_words, pattern_word_set, command in self._commands:
             # Match com palavras completas (evita "ligar" dar match em "desligar")
             # Aceita se o pattern é exatamente o texto OU se está como palavra completa
-            text_words = text_clean.split()
-            pattern_words = pattern.split()
-            
+
             # Exact match
             if text_clean == pattern:
                 logger.info(f"🎯 Command matched! Pattern: '{pattern}'")
                 await self._execute_actions(command)
                 return
-            
-            # Partial match com palavras completas (ex: "por favor ligar a luz" deve dar match em "ligar a luz")
-            if all(word in text_words for word in pattern_words):
-                # Verificar se as palavras aparecem na ordem correta
-                try:
-                    indices = [text_words.index(word) for word in pattern_words]
-                    if indices == sorted(indices):  # Palavras na ordem
-                        logger.info(f"🎯 Command matched! Pattern: '{pattern}'")
-                        await self._execute_actions(command)
-                        return
-                except ValueError:
-                    pass
+
+            # Rejeição rápida: alguma palavra do pattern nem aparece no texto
+            if not pattern_word_set <= word_set:
+                continue
+
+            # Partial match com palavras completas e na ordem correta
+            # (ex: "por favor ligar a luz" deve dar match em "ligar a luz")
+            # Subsequência ordenada com iterador compartilhado: O(texto)
+            words_iter = iter(text_words)
+            if all(word in words_iter for word in pattern_words):
+                logger.info(f"🎯 Command matched! Pattern: '{pattern}'")
+                await self._execute_actions(command)
+                return
         
         logger.info(f"❌ No command matched for text: '{text_clean}'")
     
     async def _execute_actions(self, command: dict):
         """Executa uma ou múltiplas ações do comando"""
-        # Suporte para formato antigo (action único) e novo (actions lista)
-        if "actions" in command:
-            actions_list = command["actions"]
-            if not isinstance(actions_list, list):
-                actions_list = [actions_list]
-        elif "action" in command:
-            # Formato antigo: converter para lista
-            actions_list = [{
-                "action": command["action"],
-                "entity_id": command.get("entity_id"),
-                "service_data": command.get("service_data", {})
-            }]
-        else:
+        # Lista de ações pré-normalizada no startup
+        actions_list = command.get("_actions")
+        if actions_list is None:
+            actions_list = self._normalize_actions(command)
+
+        if not actions_list:
             logger.error("❌ Command has no 'action' or 'actions' field!")
             return
-        
+
         logger.info(f"🚀 Executing {len(actions_list)} action(s)...")
-        
+
         for idx, action_config in enumerate(actions_list, 1):
             logger.info(f"  [{idx}/{len(actions_list)}] {action_config.get('action', 'unknown')}")
-            await self._execute_action(action_config)
+
+        # Dispara as ações em paralelo: a sessão aiohttp é um pool, cada
+        # chamada ao HA é independente ("boa noite" não precisa ser serial)
+        await asyncio.gather(*(self._execute_action(a) for a in actions_list))
     
-    async def _execute_action(self, action_config: dict):
-        """Executa uma ação individual no Home Assistant"""
     async def _execute_action(self, action_config: dict):
         """Executa uma ação individual no Home Assistant"""
         try:
             action = action_config.get("action")
             entity_id = action_config.get("entity_id")
-            service_data = action_config.get("service_data", {})
-            
+            url = action_config.get("_url")
+
             logger.debug(f"🚀 Executing: {action} on {entity_id}")
-            
-            # Obter token de autenticação primeiro
-            token = os.environ.get('SUPERVISOR_TOKEN')
-            if not token:
-                logger.warning("⚠️  SUPERVISOR_TOKEN not found, trying HASSIO_TOKEN...")
-                token = os.environ.get('HASSIO_TOKEN')
-            
-            if not token:
+
+            if not self._ha_token:
                 logger.error("❌ No authentication token found!")
                 logger.error("💡 Make sure 'homeassistant_api: true' is set in config.yaml")
-                logger.error("� Available env vars: " + ", ".join([k for k in os.environ.keys() if 'TOKEN' in k or 'SUPERVISOR' in k]))
+                logger.error("📋 Available env vars: " + ", ".join([k for k in os.environ.keys() if 'TOKEN' in k or 'SUPERVISOR' in k]))
                 return
-            
-            # Dividir action em domain e service (ex: "light.turn_on" -> "light", "turn_on")
-            try:
-                domain, service = action.split(".", 1)
-            except ValueError:
+
+            if not url:
                 logger.error(f"❌ Invalid action format: '{action}'. Expected 'domain.service'")
                 return
-            
-            # URL correta da API do Home Assistant via Supervisor
-            url = f"http://supervisor/core/api/services/{domain}/{service}"
-            
+
             payload = {}
             if entity_id:
                 payload["entity_id"] = entity_id
-            
-            if isinstance(service_data, str):
-                service_data = json.loads(service_data)
-            payload.update(service_data)
-            
-            headers = {
-                "Authorization": f"Bearer {token}",
-                "Content-Type": "application/json"
-            }
-            
+            payload.update(action_config.get("_service_data") or {})
+
             logger.debug(f"📡 Request URL: {url}")
             logger.debug(f"📦 Payload: {payload}")
-            logger.debug(f"🔐 Using token: {token[:10]}***")
-            
-            response = requests.post(url, json=payload, headers=headers, timeout=10)
-            
-            if response.ok:
-                logger.info(f"✅ Action executed successfully: {action} on {entity_id}")
-            else:
-                logger.error(f"❌ Failed to execute action: {response.status_code}")
-                logger.error(f"📄 Response: {response.text}")
-                
+
+            if self._http is None:
+                self._http = aiohttp.ClientSession()
+
+            # POST assíncrono: não bloqueia o event loop durante a chamada ao HA
+            async with self._http.post(
+                url,
+                data=_json_dumps(payload),
+                headers=self._ha_headers,
+                timeout=self._ha_timeout
+            ) as response:
+                if response.status < 400:
+                    logger.info(f"✅ Action executed successfully: {action} on {entity_id}")
+                else:
+                    body = await response.text()
+                    logger.error(f"❌ Failed to execute action: {response.status}")
+                    logger.error(f"📄 Response: {body}")
+
         except Exception as e:
             logger.error(f"❌ Error executing action: {e}")
             import traceback
@@ -503,8 +906,7 @@ async def main():
         logger.error("Configuration file not found!")
         sys.exit(1)
     
-    with open(config_path) as f:
-        config = json.load(f)
+    config = _json_loads(config_path.read_bytes())
     
     # Ajustar nível de log
     log_level = config.get("log_level", "info").upper()
@@ -530,4 +932,12 @@ async def main():
 
 
 if __name__ == "__main__":
+    # uvloop: event loop mais rápido para o I/O de sockets (Wyoming/RTSP/HA)
+    try:
+        import uvloop
+        uvloop.install()
+        logger.info("⚡ uvloop event loop enabled")
+    except ImportError:
+        logger.debug("uvloop not available, using default asyncio loop")
+
     asyncio.run(main())